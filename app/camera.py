@@ -6,6 +6,7 @@ from collections import deque
 
 from .motion import MotionDetector
 from .face import FaceDB
+from .recording import SegmentWriter
 
 
 class CameraWorker:
@@ -18,7 +19,7 @@ class CameraWorker:
         self.width = cfg["video"]["width"]
         self.height = cfg["video"]["height"]
         self.fps = cfg["video"]["fps"]
-        self.mode = None  # 'face' | 'motion' | 'on_motion' | None
+        self.mode = None  # 'face' | 'motion' | 'on_motion' | 'continuous' | None
 
         self.cap = None
         self.thread = None
@@ -32,6 +33,7 @@ class CameraWorker:
 
         self.recording = False
         self.writer = None
+        self.recording_failed = False  # ошибка записи (диск полон и т.п.) — не перезапускаем до start()
 
         # Буфер для стрима и предбуфер для клипов событий (~2s)
         self.buffer = deque(maxlen=int(max(1, self.fps) * 2))
@@ -46,6 +48,7 @@ class CameraWorker:
 
     def start(self, mode: str):
         self.mode = mode
+        self.recording_failed = False
         if self.thread and self.thread.is_alive():
             return
         self.cap = cv2.VideoCapture(self.device_index)
@@ -80,18 +83,16 @@ class CameraWorker:
     # ----------------------- recording helpers -----------------------
 
     def _start_recording(self):
-        if self.recording:
+        if self.recording or self.recording_failed:
             return
-        ts = time.strftime("%Y%m%d_%H%M%S")
-        path = os.path.join(self.cfg["paths"]["recordings_dir"], f"cam{self.cam_id}_{ts}.avi")
-        fourcc = cv2.VideoWriter_fourcc(*"XVID")
-        self.writer = cv2.VideoWriter(path, fourcc, self.fps, (self.width, self.height))
+        # сегменты фиксированной длины + индекс, см. recording.py
+        self.writer = SegmentWriter(self.cfg, self.cam_id, self.logger)
         self.recording = True
-        self.logger.info(f"Recording started for cam {self.cam_id}: {path}")
+        self.logger.info(f"Recording started for cam {self.cam_id}")
 
     def _stop_recording(self):
         if self.writer:
-            self.writer.release()
+            self.writer.close()
             self.writer = None
         if self.recording:
             self.logger.info(f"Recording stopped for cam {self.cam_id}")
@@ -109,7 +110,10 @@ class CameraWorker:
         os.makedirs(out_dir, exist_ok=True)
         p = os.path.join(out_dir, name)
         small = self._downscale(frame, 320, 240)
-        cv2.imwrite(p, small, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+        # пишем во временный файл и переименовываем: галерея не увидит недописанный снимок
+        tmp = p + ".tmp.jpg"
+        if cv2.imwrite(tmp, small, [int(cv2.IMWRITE_JPEG_QUALITY), 70]):
+            os.replace(tmp, p)
         return name  # только имя файла (UI отдаёт через /events/thumbs/<name>)
 
     def _start_event_clip(self):
@@ -183,6 +187,13 @@ class CameraWorker:
                     triggered = True
                     event_meta = {"type": "face", "name": name, "conf": float(conf)}
 
+            # Непрерывная запись сегментами
+            if self.mode == "continuous":
+                if not self.recording:
+                    self._start_recording()
+            elif self.mode != "on_motion" and self.recording:
+                self._stop_recording()
+
             # Управление записью для режима on_motion
             if self.mode == "on_motion":
                 if triggered and not self.recording:
@@ -218,9 +229,12 @@ class CameraWorker:
             if self.event_clip_active:
                 self._update_event_clip(frame)
 
-            # Если идёт запись «on_motion» — пишем полноразмерный AVI
+            # Если идёт запись (continuous / on_motion) — пишем полноразмерный кадр в сегмент
             if self.recording and self.writer is not None:
-                self.writer.write(frame)
+                if not self.writer.write(frame):
+                    # причина уже в логе; стрим и детекция продолжают работать
+                    self.recording_failed = True
+                    self._stop_recording()
 
             # Обновляем последний кадр и предбуфер
             with self.frame_lock:
@@ -0,0 +1,161 @@
+import os
+import re
+import hashlib
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+# Мини-снимки событий: data/events/thumbs/cam{N}_YYYYMMDD_HHMMSS.jpg (см. CameraWorker._save_event_snapshot)
+THUMB_RE = re.compile(r"^cam(\d+)_(\d{8}_\d{6})\.jpg$")
+ETAG_RE = re.compile(r"[0-9a-f]{40}")
+
+
+def events_dir(cfg, folder):
+    return os.path.normpath(os.path.join(cfg["paths"]["recordings_dir"], "..", "events", folder))
+
+
+class ThumbIndex:
+    """Список мини-снимков в памяти; каталог перечитывается только при изменении его mtime."""
+
+    def __init__(self, cfg):
+        self.dir = events_dir(cfg, "thumbs")
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._items = []  # [(ts, cam_id, name)] по возрастанию времени
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.dir).st_mtime_ns
+        except OSError:
+            return []
+        with self._lock:
+            if mtime == self._mtime:
+                return self._items
+        items = []
+        for fn in os.listdir(self.dir):
+            m = THUMB_RE.match(fn)
+            if not m:
+                continue
+            try:
+                ts = datetime.strptime(m.group(2), "%Y%m%d_%H%M%S").timestamp()
+            except ValueError:
+                continue  # имя похоже на снимок, но дата невозможная
+            items.append((ts, int(m.group(1)), fn))
+        items.sort()
+        with self._lock:
+            self._mtime = mtime
+            self._items = items
+        return items
+
+    def query(self, cam_id=None, start=None, end=None):
+        """Снимки за интервал [start, end], от новых к старым."""
+        out = []
+        for ts, cid, name in reversed(self._refresh()):
+            if end is not None and ts > end:
+                continue
+            if start is not None and ts < start:
+                break
+            if cam_id is not None and cid != cam_id:
+                continue
+            out.append((ts, cid, name))
+        return out
+
+
+class SheetCache:
+    """Контакт-листы (спрайты) из мини-снимков, кэш на диске с LRU-вытеснением по размеру."""
+
+    def __init__(self, cfg):
+        g = cfg.get("gallery", {})
+        self.thumbs_dir = events_dir(cfg, "thumbs")
+        self.dir = os.path.abspath(events_dir(cfg, "sheets"))
+        self.cols = int(g.get("sheet_cols", 10))
+        self.tile_w = int(g.get("tile_width", 160))
+        self.tile_h = int(g.get("tile_height", 120))
+        self.quality = int(g.get("jpeg_quality", 75))
+        self.max_bytes = int(float(g.get("cache_max_mb", 64)) * 1024 * 1024)
+        self._lock = threading.Lock()
+
+    def etag(self, items):
+        """Сильный ETag: зависит только от набора снимков и параметров раскладки."""
+        h = hashlib.sha1(f"{self.cols}x{self.tile_w}x{self.tile_h}q{self.quality}".encode())
+        for _, _, name in items:
+            h.update(name.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def layout(self, items):
+        """Положение каждого снимка на листе: [{name, ts, x, y}]."""
+        return [{"name": name, "ts": ts,
+                 "x": (i % self.cols) * self.tile_w, "y": (i // self.cols) * self.tile_h}
+                for i, (ts, _, name) in enumerate(items)]
+
+    def cached(self, etag):
+        """Путь к уже собранному листу по ETag или None."""
+        # etag приходит из запроса (?v=) — только sha1, иначе это путь за пределы кэша
+        if not isinstance(etag, str) or not ETAG_RE.fullmatch(etag):
+            return None
+        p = os.path.join(self.dir, etag + ".jpg")
+        try:
+            # отметка использования для LRU
+            os.utime(p, None)
+        except OSError:
+            return None
+        return p
+
+    def get(self, items):
+        """Путь к готовому листу; собирает его при первом обращении. None — не удалось записать."""
+        os.makedirs(self.dir, exist_ok=True)
+        etag = self.etag(items)
+        p = self.cached(etag)
+        if p:
+            return p
+        p = os.path.join(self.dir, etag + ".jpg")
+        img = self._render(items)
+        tmp = f"{p}.{threading.get_ident()}.tmp.jpg"
+        if not cv2.imwrite(tmp, img, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]):
+            return None
+        os.replace(tmp, p)
+        self._evict(keep=p)
+        return p
+
+    def _render(self, items):
+        rows = max(1, (len(items) + self.cols - 1) // self.cols)
+        cols = min(self.cols, max(1, len(items)))
+        sheet = np.zeros((rows * self.tile_h, cols * self.tile_w, 3), dtype=np.uint8)
+        for i, (_, _, name) in enumerate(items):
+            img = cv2.imread(os.path.join(self.thumbs_dir, name), cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            x = (i % self.cols) * self.tile_w
+            y = (i // self.cols) * self.tile_h
+            sheet[y:y + self.tile_h, x:x + self.tile_w] = cv2.resize(img, (self.tile_w, self.tile_h))
+        return sheet
+
+    def _evict(self, keep=None):
+        with self._lock:
+            files = []
+            total = 0
+            for fn in os.listdir(self.dir):
+                if fn.endswith(".tmp.jpg"):
+                    continue  # лист, который сейчас пишет другой запрос
+                p = os.path.join(self.dir, fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+            files.sort()
+            for _, size, p in files:
+                if total <= self.max_bytes:
+                    break
+                if p == keep:
+                    continue
+                try:
+                    os.remove(p)
+                except OSError:
+                    continue
+                total -= size
+
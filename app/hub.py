@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import threading
+import urllib.parse
+import urllib.request
+
+import cv2
+import numpy as np
+import yaml
+from flask import Flask, render_template, Response, request, jsonify, abort
+
+from .storage import EventJournal, get_logger
+from .stream import mjpeg_part
+
+
+class NodeClient:
+    """Опрос одного экземпляра nvr: статус камер и события по курсору (/api/journal)."""
+
+    def __init__(self, name, url, hub_cfg, journal, logger):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.journal = journal
+        self.logger = logger
+        self.poll_seconds = float(hub_cfg.get("poll_seconds", 2.0))
+        self.timeout = float(hub_cfg.get("timeout", 5.0))
+
+        self.node = None    # id процесса узла; смена = узел перезапущен, курсор сбрасываем
+        self.cursor = 0
+        self.status = {}
+        self.online = False
+        self.last_seen = None
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name=f"Hub-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _get(self, path, **params):
+        url = f"{self.url}{path}"
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        with urllib.request.urlopen(url, timeout=self.timeout) as r:
+            return json.loads(r.read().decode("utf-8"))
+
+    def poll(self):
+        self.status = self._get("/api/status")
+        while True:
+            delta = self._get("/api/journal", since=self.cursor)
+            if delta["node"] != self.node:
+                if self.node is not None:
+                    self.logger.info(f"Hub: node {self.name} restarted, resyncing events")
+                self.node = delta["node"]
+                if self.cursor:
+                    # курсор от прошлого запуска узла — перечитываем с начала
+                    self.cursor = 0
+                    continue
+            for e in delta["events"]:
+                self.journal.append({"node": self.name, "node_seq": e["seq"], "ts": e["ts"],
+                                     "level": e["level"], "msg": e["msg"]})
+            self.cursor = delta["cursor"]
+            if not delta.get("more"):
+                break
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+                if not self.online:
+                    self.logger.info(f"Hub: node {self.name} online ({self.url})")
+                self.online = True
+                self.error = None
+                self.last_seen = time.time()
+            except Exception as e:
+                if self.online:
+                    self.logger.info(f"Hub: node {self.name} offline: {e}")
+                self.online = False
+                self.error = str(e)
+            self.stopped.wait(self.poll_seconds)
+
+    def describe(self):
+        return {"url": self.url, "online": self.online, "last_seen": self.last_seen,
+                "error": self.error, "cameras": self.status}
+
+
+class StreamRelay:
+    """Одно подключение к превью камеры узла, раздаваемое всем зрителям хаба.
+
+    Подключение открывается с первым зрителем и закрывается через idle_seconds после ухода последнего.
+    """
+
+    def __init__(self, url, hub_cfg, logger):
+        self.url = url
+        self.logger = logger
+        self.timeout = float(hub_cfg.get("timeout", 5.0))
+        self.idle_seconds = float(hub_cfg.get("idle_seconds", 5.0))
+        self.stale_seconds = float(hub_cfg.get("stale_seconds", 5.0))
+        self.keepalive_seconds = float(hub_cfg.get("keepalive_seconds", 2.0))
+        self.lock = threading.Lock()
+        self.viewers = 0
+        self.idle_since = None
+        self.frame = None
+        self.frame_ts = 0.0
+        self.seq = 0
+        self.thread = None
+
+    def subscribe(self):
+        with self.lock:
+            self.viewers += 1
+            self.idle_since = None
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="HubRelay", daemon=True)
+                self.thread.start()
+
+    def unsubscribe(self):
+        with self.lock:
+            self.viewers -= 1
+            if self.viewers <= 0:
+                self.viewers = 0
+                self.idle_since = time.time()
+
+    def latest(self):
+        with self.lock:
+            if self.frame is not None and time.time() - self.frame_ts > self.stale_seconds:
+                # узел молчит — не выдаём замёрзшую картинку за живую
+                self.frame = None
+            return self.seq, self.frame
+
+    def _idle(self):
+        with self.lock:
+            return self.viewers == 0 and self.idle_since is not None \
+                and time.time() - self.idle_since > self.idle_seconds
+
+    def _close_if_idle(self):
+        # решение о закрытии принимается под тем же замком, что и subscribe(),
+        # иначе новый зритель может «прицепиться» к завершающемуся потоку
+        with self.lock:
+            if self.viewers == 0 and self.idle_since is not None \
+                    and time.time() - self.idle_since > self.idle_seconds:
+                self.thread = None
+                self.frame = None
+                return True
+            return False
+
+    def _run(self):
+        self.logger.info(f"Hub: relay opened {self.url}")
+        while not self._close_if_idle():
+            try:
+                with urllib.request.urlopen(self.url, timeout=self.timeout) as r:
+                    self._pump(r)
+            except Exception:
+                time.sleep(1.0)
+        self.logger.info(f"Hub: relay closed {self.url}")
+
+    def _pump(self, r):
+        """Читает части multipart-потока узла (с Content-Length, см. stream.mjpeg_part)."""
+        while not self._idle():
+            length = None
+            line = r.readline()
+            if not line:
+                return
+            if not line.startswith(b"--"):
+                continue
+            while True:
+                line = r.readline()
+                if not line:
+                    return
+                line = line.strip()
+                if not line:
+                    break
+                k, _, v = line.partition(b":")
+                if k.strip().lower() == b"content-length":
+                    length = int(v.strip())
+            if length is None:
+                continue
+            jpeg = r.read(length)
+            if len(jpeg) < length:
+                return
+            with self.lock:
+                self.frame = jpeg
+                self.frame_ts = time.time()
+                self.seq += 1
+
+    def frames(self, fps):
+        delay = 1.0 / max(0.1, fps)
+        self.subscribe()
+        try:
+            last = None
+            sent_at = 0.0
+            while True:
+                seq, jpeg = self.latest()
+                now = time.time()
+                if jpeg is not None and seq != last:
+                    last = seq
+                    sent_at = now
+                    yield mjpeg_part(jpeg)
+                elif now - sent_at >= self.keepalive_seconds:
+                    # пишем клиенту хотя бы раз в keepalive_seconds: только запись в сокет
+                    # показывает, что оператор закрыл вкладку, и освобождает relay
+                    sent_at = now
+                    yield mjpeg_part(jpeg if jpeg is not None else no_signal_jpeg())
+                time.sleep(delay)
+        finally:
+            self.unsubscribe()
+
+
+_no_signal = None
+
+
+def no_signal_jpeg():
+    """Заглушка «NO SIGNAL» для превью, когда от узла нет кадров."""
+    global _no_signal
+    if _no_signal is None:
+        img = np.full((240, 320, 3), 64, dtype=np.uint8)
+        cv2.putText(img, "NO SIGNAL", (70, 130), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+        _no_signal = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 70])[1].tobytes()
+    return _no_signal
+
+
+def create_hub_app(config_path=None):
+    config_path = config_path or os.environ.get("NVR_HUB_CONFIG") or os.path.join(os.path.dirname(__file__), '..', 'hub.yaml')
+    cfg = yaml.safe_load(open(config_path, 'r', encoding='utf-8'))
+    hub_cfg = cfg.get("hub", {})
+    logger = get_logger(cfg)
+
+    base_dir = os.path.dirname(__file__)
+    proj_root = os.path.normpath(os.path.join(base_dir, ".."))
+    app = Flask(__name__, template_folder=os.path.join(proj_root, "templates"))
+
+    # Общий журнал событий всех узлов с собственным курсором хаба
+    journal = EventJournal(maxlen=int(hub_cfg.get("journal_size", 20000)))
+    nodes = {}
+    for n in cfg["nodes"]:
+        nodes[n["name"]] = NodeClient(n["name"], n["url"], hub_cfg, journal, logger)
+    for node in nodes.values():
+        node.start()
+
+    preview_fps = float(hub_cfg.get("preview_fps", 2))
+    preview_width = int(hub_cfg.get("preview_width", 320))
+    relays = {}
+    relays_lock = threading.Lock()
+
+    def get_relay(name, cam_id):
+        node = nodes.get(name)
+        # только камеры, о которых узел сообщил в /api/status — иначе любой cam_id плодил бы relay
+        if node is None or str(cam_id) not in node.status:
+            abort(404)
+        with relays_lock:
+            relay = relays.get((name, cam_id))
+            if relay is None:
+                url = f"{node.url}/stream/{cam_id}.mjpg?fps={preview_fps:g}&width={preview_width}"
+                relay = relays[(name, cam_id)] = StreamRelay(url, hub_cfg, logger)
+            return relay
+
+    @app.route('/')
+    def index():
+        return render_template('hub.html', nodes=list(nodes.keys()))
+
+    @app.get('/api/nodes')
+    def api_nodes():
+        return jsonify({name: node.describe() for name, node in nodes.items()})
+
+    @app.get('/api/events')
+    def api_events():
+        since = request.args.get('since', 0, type=int)
+        limit = max(1, min(1000, request.args.get('limit', 500, type=int)))
+        return jsonify(journal.delta(since, limit))
+
+    @app.get('/stream/<name>/<int:cam_id>.mjpg')
+    def stream(name, cam_id):
+        relay = get_relay(name, cam_id)
+        return Response(relay.frames(preview_fps), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+    @app.get('/healthz')
+    def healthz():
+        return "ok"
+
+    return app
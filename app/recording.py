@@ -0,0 +1,284 @@
+import os
+import struct
+import time
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import cv2
+
+# Сегменты записи: data/recordings/cam{N}/<start_ms>.mjpg — склеенные JPEG-кадры,
+# рядом <start_ms>.idx — компактный индекс кадров (ts, offset, size) по 16 байт.
+# Отдача диапазона времени = чтение нужных байт без декодирования видео.
+IDX_RECORD = struct.Struct("<dII")
+SEG_EXT = ".mjpg"
+IDX_EXT = ".idx"
+# непрерывная запись без срока хранения заполнит SD-карту
+DEFAULT_RETENTION_HOURS = 72
+
+
+def camera_dir(cfg, cam_id):
+    return os.path.join(cfg["paths"]["recordings_dir"], f"cam{cam_id}")
+
+
+class SegmentWriter:
+    """Пишет кадры камеры в сегменты фиксированной длины (segment_seconds)."""
+
+    def __init__(self, cfg, cam_id, logger):
+        rec = cfg.get("recording", {})
+        self.cfg = cfg
+        self.cam_id = cam_id
+        self.logger = logger
+        self.out_dir = camera_dir(cfg, cam_id)
+        self.segment_seconds = float(rec.get("segment_seconds", 60))
+        self.quality = int(rec.get("jpeg_quality", 80))
+        self.seg_file = None
+        self.idx_file = None
+        self.seg_start = 0.0
+        self.offset = 0
+        self.failed = False
+
+    def _open(self, ts):
+        os.makedirs(self.out_dir, exist_ok=True)
+        ms = int(ts * 1000)
+        # имя занято (перезапуск в ту же мс, шаг часов назад на Pi без RTC) — берём следующее
+        # (в т.ч. осиротевший .mjpg без .idx — его не перезаписываем)
+        while True:
+            name = str(ms)
+            ms += 1
+            try:
+                idx_file = open(os.path.join(self.out_dir, name + IDX_EXT), "xb")
+            except FileExistsError:
+                continue
+            try:
+                self.seg_file = open(os.path.join(self.out_dir, name + SEG_EXT), "xb")
+            except FileExistsError:
+                idx_file.close()
+                os.remove(idx_file.name)
+                continue
+            except OSError:
+                idx_file.close()
+                raise
+            self.idx_file = idx_file
+            break
+        self.seg_start = ts
+        self.offset = 0
+        self.logger.info(f"Recording segment opened for cam {self.cam_id}: {name}{SEG_EXT}")
+
+    def write(self, frame, ts=None):
+        """Пишет кадр; False — запись невозможна (диск полон, нет прав), писатель закрыт."""
+        if self.failed:
+            return False
+        ts = time.time() if ts is None else ts
+        try:
+            if self.seg_file is not None and ts - self.seg_start >= self.segment_seconds:
+                self.close()
+            ok, jpeg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+            if not ok:
+                return True
+            if self.seg_file is None:
+                self._open(ts)
+            data = jpeg.tobytes()
+            self.seg_file.write(data)
+            # индекс пишем после данных: запись в .idx гарантирует, что байты кадра уже есть
+            self.seg_file.flush()
+            self.idx_file.write(IDX_RECORD.pack(ts, self.offset, len(data)))
+            self.idx_file.flush()
+            self.offset += len(data)
+            return True
+        except OSError as e:
+            # не роняем поток камеры: один раз пишем в лог и прекращаем запись
+            self.failed = True
+            self.logger.error(f"Recording failed for cam {self.cam_id}: {e}")
+            self.close()
+            return False
+
+    def close(self):
+        was_open = self.seg_file is not None
+        for f in (self.seg_file, self.idx_file):
+            if f:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self.seg_file = None
+        self.idx_file = None
+        if was_open:
+            try:
+                prune_segments(self.cfg, self.cam_id, self.logger)
+            except OSError as e:
+                self.logger.error(f"Pruning recordings failed for cam {self.cam_id}: {e}")
+
+
+class SegmentIndex:
+    """Индекс сегментов одной камеры: время -> (сегмент, смещение кадра)."""
+
+    def __init__(self, cfg, cam_id):
+        self.cam_id = cam_id
+        self.dir = camera_dir(cfg, cam_id)
+        self._lock = threading.Lock()
+        self.cache_size = int(cfg.get("recording", {}).get("index_cache_segments", 256))
+        self._frames = OrderedDict()  # name -> (размер .idx, список записей), LRU
+
+    def segments(self):
+        """Отсортированный список (start_ts, name) всех сегментов камеры."""
+        if not os.path.isdir(self.dir):
+            return []
+        out = []
+        for fn in os.listdir(self.dir):
+            name, ext = os.path.splitext(fn)
+            if ext == IDX_EXT and name.isdigit():
+                out.append((int(name) / 1000.0, name))
+        out.sort()
+        # удалённые (prune_segments) сегменты выкидываем из кэша
+        names = {name for _, name in out}
+        with self._lock:
+            for name in [n for n in self._frames if n not in names]:
+                del self._frames[name]
+        return out
+
+    def frames(self, name):
+        """Записи кадров сегмента [(ts, offset, size), ...]; кэшируются до изменения .idx."""
+        p = os.path.join(self.dir, name + IDX_EXT)
+        try:
+            size = os.path.getsize(p)
+        except OSError:
+            return []
+        with self._lock:
+            cached = self._frames.get(name)
+            if cached and cached[0] == size:
+                self._frames.move_to_end(name)
+                return cached[1]
+        with open(p, "rb") as f:
+            raw = f.read(size - size % IDX_RECORD.size)
+        recs = list(IDX_RECORD.iter_unpack(raw))
+        with self._lock:
+            self._frames[name] = (size, recs)
+            self._frames.move_to_end(name)
+            while len(self._frames) > self.cache_size:
+                self._frames.popitem(last=False)
+        return recs
+
+    def segment_path(self, name):
+        return os.path.join(self.dir, name + SEG_EXT)
+
+    def describe(self, start=None, end=None):
+        """Сводка по сегментам, пересекающим [start, end]."""
+        out = []
+        for seg_start, name in self._overlapping(start, end):
+            recs = self.frames(name)
+            if not recs:
+                continue
+            out.append({
+                "segment": name,
+                "start": recs[0][0],
+                "end": recs[-1][0],
+                "frames": len(recs),
+                "bytes": recs[-1][1] + recs[-1][2],
+            })
+        return out
+
+    def _overlapping(self, start, end):
+        segs = self.segments()
+        if start is not None:
+            # сегмент, начавшийся до start, может его покрывать
+            i = max(0, bisect.bisect_right(segs, (start, "~")) - 1)
+            segs = segs[i:]
+        if end is not None:
+            segs = [s for s in segs if s[0] <= end]
+        return segs
+
+    def spans(self, start, end):
+        """Байтовые диапазоны кадров в [start, end]: [(path, offset, length, [(ts, size)...]), ...].
+
+        Соседние кадры одного сегмента лежат подряд, поэтому диапазон на сегмент один.
+        """
+        out = []
+        for _, name in self._overlapping(start, end):
+            recs = self.frames(name)
+            if not recs:
+                continue
+            times = [r[0] for r in recs]
+            i = bisect.bisect_left(times, start)
+            j = bisect.bisect_right(times, end)
+            if i >= j:
+                continue
+            sel = recs[i:j]
+            off = sel[0][1]
+            length = sel[-1][1] + sel[-1][2] - off
+            out.append((self.segment_path(name), off, length, [(r[0], r[2]) for r in sel]))
+        return out
+
+
+def parse_ts(value):
+    """Время из запроса: epoch-секунды или ISO 8601 / YYYYMMDD_HHMMSS (локальное время)."""
+    if value is None or value == "":
+        return None
+    try:
+        return datetime.strptime(value, "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def read_span_bytes(spans, first, last):
+    """Читает байты [first, last] (включительно) из виртуальной склейки spans."""
+    pos = 0
+    for path, off, length, _ in spans:
+        lo, hi = pos, pos + length - 1
+        pos += length
+        if hi < first:
+            continue
+        if lo > last:
+            break
+        a = max(first, lo) - lo
+        b = min(last, hi) - lo + 1
+        with open(path, "rb") as f:
+            f.seek(off + a)
+            remaining = b - a
+            while remaining > 0:
+                chunk = f.read(min(64 * 1024, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+
+def iter_span_frames(spans):
+    """Отдаёт (ts, jpeg_bytes) по очереди, читая только нужные кадры."""
+    for path, off, _, frames in spans:
+        with open(path, "rb") as f:
+            f.seek(off)
+            for ts, size in frames:
+                data = f.read(size)
+                if len(data) < size:
+                    return
+                yield ts, data
+
+
+def prune_segments(cfg, cam_id, logger=None):
+    """Удаляет сегменты старше recording.retention_hours (0 — хранить всё)."""
+    hours = float(cfg.get("recording", {}).get("retention_hours", DEFAULT_RETENTION_HOURS) or 0)
+    if hours <= 0:
+        return 0
+    index = SegmentIndex(cfg, cam_id)
+    cutoff = time.time() - hours * 3600
+    segs = index.segments()
+    removed = 0
+    # последний сегмент может ещё писаться — не трогаем
+    for start, name in segs[:-1]:
+        if start >= cutoff:
+            break
+        for ext in (SEG_EXT, IDX_EXT):
+            try:
+                os.remove(os.path.join(index.dir, name + ext))
+            except OSError:
+                pass
+        removed += 1
+    if removed and logger:
+        logger.info(f"Pruned {removed} recording segments for cam {cam_id}")
+    return removed
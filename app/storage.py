@@ -1,4 +1,8 @@
 import os
+import time
+import uuid
+import threading
+from collections import deque
 from logging.handlers import RotatingFileHandler
 import logging
 
@@ -8,15 +12,17 @@ def ensure_dirs(cfg):
         d = cfg["paths"][key]
         os.makedirs(d, exist_ok=True)
 
-    # Каталоги медиа событий (мини-снимки/клипы) под data/events/{thumbs,clips}
+    # Каталоги медиа событий (мини-снимки/клипы/контакт-листы) под data/events/{thumbs,clips,sheets}
     base_data = os.path.dirname(cfg["paths"]["logs_dir"])  # .../data
     events_base = os.path.join(base_data, "events")
     os.makedirs(os.path.join(events_base, "thumbs"), exist_ok=True)
     os.makedirs(os.path.join(events_base, "clips"), exist_ok=True)
+    os.makedirs(os.path.join(events_base, "sheets"), exist_ok=True)
 
 def get_logger(cfg):
     os.makedirs(os.path.dirname(cfg["logging"]["file"]), exist_ok=True)
-    logger = logging.getLogger("atm_cctv")
+    # отдельное имя — отдельные обработчики/журнал (несколько экземпляров в одном процессе, тесты)
+    logger = logging.getLogger(cfg["logging"].get("name", "atm_cctv"))
     logger.setLevel(getattr(logging, cfg["logging"]["level"]))
     if not any(isinstance(h, RotatingFileHandler) for h in logger.handlers):
         handler = RotatingFileHandler(
@@ -27,6 +33,54 @@ def get_logger(cfg):
         logger.addHandler(handler)
     return logger
 
+class EventJournal(logging.Handler):
+    """Последние события в памяти с возрастающим seq — для инкрементальной выдачи по курсору.
+
+    node — случайный id процесса: после перезапуска seq начинается заново,
+    и клиент по смене node понимает, что курсор нужно сбросить.
+    """
+
+    def __init__(self, maxlen=5000):
+        super().__init__(level=logging.INFO)
+        self.node = uuid.uuid4().hex
+        self.seq = 0
+        self.items = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            self.append({"ts": record.created, "level": record.levelname, "msg": record.getMessage()})
+        except Exception:
+            self.handleError(record)
+
+    def append(self, entry):
+        with self._lock:
+            self.seq += 1
+            entry = dict(entry, seq=self.seq)
+            entry.setdefault("ts", time.time())
+            self.items.append(entry)
+        return entry
+
+    def delta(self, since=0, limit=500):
+        """События с seq > since (не более limit) и новый курсор."""
+        with self._lock:
+            items = list(self.items)
+            last = self.seq
+        out = [e for e in items if e["seq"] > since][:limit]
+        cursor = out[-1]["seq"] if out else min(since, last)
+        return {"node": self.node, "cursor": cursor, "events": out,
+                "more": bool(out) and out[-1]["seq"] < last}
+
+
+def get_journal(logger):
+    """Журнал событий, подключённый к логгеру (один на процесс, как и файловый обработчик)."""
+    for h in logger.handlers:
+        if isinstance(h, EventJournal):
+            return h
+    journal = EventJournal()
+    logger.addHandler(journal)
+    return journal
+
 def list_people(faces_dir):
     people = []
     if not os.path.isdir(faces_dir):
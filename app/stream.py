@@ -1,21 +1,29 @@
 import cv2
+import time
 from flask import Response
 
-def mjpeg_generator(get_frame_fn, fps=15):
-    delay = 1.0 / max(1, fps)
+
+def mjpeg_part(jpeg):
+    """Одна часть multipart-потока; Content-Length позволяет читать поток без поиска границ."""
+    jpeg = bytes(jpeg)
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n'
+            b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+
+
+def mjpeg_generator(get_frame_fn, fps=15, width=None, quality=80):
+    delay = 1.0 / max(0.1, fps)
     while True:
         frame = get_frame_fn()
         if frame is None:
             # send blank
-            import numpy as np, time
-            blank = (255 * (np.ones((240,320,3), dtype=np.uint8))).copy()
-            ret, jpeg = cv2.imencode('.jpg', blank, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + bytearray(jpeg) + b'\r\n')
-            time.sleep(delay)
-            continue
-        ret, jpeg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-        if not ret:
-            continue
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + bytearray(jpeg) + b'\r\n')
+            import numpy as np
+            frame = (255 * (np.ones((240,320,3), dtype=np.uint8))).copy()
+        elif width and frame.shape[1] > width:
+            # превью пониженного разрешения (например, для хаба)
+            h = max(1, int(frame.shape[0] * width / frame.shape[1]))
+            frame = cv2.resize(frame, (int(width), h), interpolation=cv2.INTER_AREA)
+        ret, jpeg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if ret:
+            yield mjpeg_part(jpeg)
+        time.sleep(delay)
@@ -1,20 +1,25 @@
-import os, io, json, yaml
+import os, io, json, time, yaml
 from flask import send_file  # вверху файла, если ещё не импортировано
 from flask import Response
 from flask import Flask, render_template, Response, request, redirect, url_for, send_from_directory, jsonify, abort
-from .storage import ensure_dirs, get_logger, list_people
+from .storage import ensure_dirs, get_logger, get_journal, list_people
 from .camera import CameraWorker
-from .stream import mjpeg_generator
+from .stream import mjpeg_generator, mjpeg_part
 from .face import FaceDB
 from .motion import MotionDetector
+from .recording import SegmentIndex, parse_ts, read_span_bytes, iter_span_frames
+from .gallery import ThumbIndex, SheetCache
 import cv2
 import numpy as np
 from datetime import datetime
 
-def create_app():
-    cfg = yaml.safe_load(open(os.path.join(os.path.dirname(__file__),'..','config.yaml'),'r',encoding='utf-8'))
+def create_app(config_path=None):
+    # NVR_CONFIG позволяет поднять несколько экземпляров на одной машине (например, для хаба)
+    config_path = config_path or os.environ.get("NVR_CONFIG") or os.path.join(os.path.dirname(__file__),'..','config.yaml')
+    cfg = yaml.safe_load(open(config_path,'r',encoding='utf-8'))
     ensure_dirs(cfg)
     logger = get_logger(cfg)
+    journal = get_journal(logger)
 
     base_dir = os.path.dirname(__file__)
     proj_root = os.path.normpath(os.path.join(base_dir, ".."))
@@ -31,6 +36,13 @@ def create_app():
     for c in cfg["cameras"]:
         cameras[c["id"]] = CameraWorker(cfg, c, logger)
 
+    # Индексы сегментов записи по камерам
+    rec_index = {cid: SegmentIndex(cfg, cid) for cid in cameras}
+
+    # Галерея мини-снимков событий и кэш контакт-листов
+    thumbs = ThumbIndex(cfg)
+    sheets = SheetCache(cfg)
+
     # Face DB helper
     face_db = FaceDB(cfg)
     face_db.load() or face_db.train()
@@ -44,7 +56,12 @@ def create_app():
         cam = cameras.get(cam_id)
         if not cam:
             abort(404)
-        return Response(mjpeg_generator(cam.get_frame, fps=cfg["video"]["fps"]),
+        # ?fps=2&width=320 — облегчённое превью (используется хабом)
+        fps = min(cfg["video"]["fps"], request.args.get('fps', cfg["video"]["fps"], type=float))
+        width = request.args.get('width', type=int)
+        if fps <= 0 or (width is not None and width < 16):
+            abort(400, "bad fps/width")
+        return Response(mjpeg_generator(cam.get_frame, fps=fps, width=width),
                         mimetype='multipart/x-mixed-replace; boundary=frame')
 
     # Control API
@@ -75,6 +92,65 @@ def create_app():
         base = os.path.normpath(os.path.join(cfg['paths']['recordings_dir'], '..', 'events', folder))
         return send_from_directory(base, fname)
 
+    # Gallery: постраничные мини-снимки событий и контакт-листы
+    def _gallery_page():
+        try:
+            start = parse_ts(request.args.get('start'))
+            end = parse_ts(request.args.get('end'))
+        except ValueError:
+            abort(400, "bad start/end")
+        cam_id = request.args.get('cam', type=int)
+        page_size = int(cfg.get("gallery", {}).get("page_size", 100))
+        limit = max(1, min(page_size, request.args.get('limit', page_size, type=int)))
+        page = max(0, request.args.get('page', 0, type=int))
+        items = thumbs.query(cam_id, start, end)
+        pages = (len(items) + limit - 1) // limit
+        return items[page * limit:(page + 1) * limit], page, pages, len(items)
+
+    @app.get('/api/events')
+    def api_events():
+        items, page, pages, total = _gallery_page()
+        layout = sheets.layout(items)
+        out = []
+        for (ts, cid, name), pos in zip(items, layout):
+            out.append({"cam": cid, "ts": ts, "name": name,
+                        "url": url_for('events_file', folder='thumbs', fname=name),
+                        "sheet_x": pos["x"], "sheet_y": pos["y"]})
+        # v — ETag именно этого набора снимков: лист по ссылке совпадает с sheet_x/sheet_y ответа
+        sheet = url_for('events_sheet', **dict(request.args.to_dict(), v=sheets.etag(items))) if items else None
+        return jsonify({"items": out, "page": page, "pages": pages, "total": total, "sheet": sheet,
+                        "tile": [sheets.tile_w, sheets.tile_h]})
+
+    @app.get('/api/events/sheet.jpg')
+    def events_sheet():
+        """Контакт-лист той же страницы, что и /api/events; собирается лениво и кэшируется.
+
+        Ссылка содержит v=<etag>, поэтому её содержимое неизменно. Без v — редирект на текущую версию.
+        """
+        version = request.args.get('v')
+        headers = {"Cache-Control": "public, max-age=31536000, immutable"}
+        if version:
+            # cached() принимает только sha1-ETag; всё прочее (в т.ч. «../») — 404 ниже
+            path = sheets.cached(version)
+            if path is None:
+                items = _gallery_page()[0]
+                if not items or sheets.etag(items) != version:
+                    # набор снимков страницы изменился — клиенту нужно перечитать /api/events
+                    abort(404)
+                path = sheets.get(items)
+                if path is None:
+                    abort(500)
+            headers["ETag"] = f'"{version}"'
+            if version in request.if_none_match:
+                return Response(status=304, headers=headers)
+            resp = send_file(path, mimetype='image/jpeg', etag=False, conditional=False)
+            resp.headers.update(headers)
+            return resp
+        items = _gallery_page()[0]
+        if not items:
+            abort(404)
+        return redirect(url_for('events_sheet', **dict(request.args.to_dict(), v=sheets.etag(items))))
+
     @app.get('/logs')
     def logs_page():
         log_file = cfg["logging"]["file"]
@@ -154,6 +230,88 @@ def create_app():
             stat[cid] = {"mode": cam.mode, "recording": cam.recording}
         return jsonify(stat)
 
+    # Журнал событий по курсору: {"node", "cursor", "events", "more"}
+    @app.get('/api/journal')
+    def api_journal():
+        since = request.args.get('since', 0, type=int)
+        limit = max(1, min(1000, request.args.get('limit', 500, type=int)))
+        return jsonify(journal.delta(since, limit))
+
+    # Recordings: поиск и отдача диапазона времени из сегментов
+    def _rec_range(cam_id, span=None):
+        index = rec_index.get(cam_id)
+        if index is None:
+            abort(404)
+        try:
+            start = parse_ts(request.args.get('start'))
+            end = parse_ts(request.args.get('end'))
+        except ValueError:
+            abort(400, "bad start/end")
+        # окно ограничено: иначе пришлось бы разобрать индексы всех сегментов камеры
+        max_window = float(cfg.get("recording", {}).get("max_window_hours", 24)) * 3600
+        if end is None:
+            end = time.time() if start is None else start + (span or max_window)
+        if start is None:
+            start = end - max_window
+        if end - start > max_window:
+            abort(400, "time window too large")
+        return index, start, end
+
+    @app.get('/api/recordings/<int:cam_id>')
+    def api_recordings(cam_id):
+        index, start, end = _rec_range(cam_id)
+        return jsonify(index.describe(start, end))
+
+    @app.get('/recordings/<int:cam_id>/clip.mjpg')
+    def recording_clip(cam_id):
+        """Кадры [start, end] одной MJPEG-склейкой, с поддержкой Range."""
+        if not request.args.get('start') or not request.args.get('end'):
+            abort(400, "start and end are required")
+        index, start, end = _rec_range(cam_id)
+        if end < start:
+            abort(400, "end before start")
+        spans = index.spans(start, end)
+        total = sum(s[2] for s in spans)
+        if total == 0:
+            abort(404)
+        headers = {"Accept-Ranges": "bytes"}
+        if request.args.get('download'):
+            fname = f"cam{cam_id}_{datetime.fromtimestamp(start).strftime('%Y%m%d_%H%M%S')}.mjpg"
+            headers["Content-Disposition"] = f'attachment; filename="{fname}"'
+        status = 200
+        first, last = 0, total - 1
+        if request.range is not None:
+            rng = request.range.range_for_length(total)
+            if rng is None:
+                return Response(status=416, headers={"Content-Range": f"bytes */{total}"})
+            first, last = rng[0], rng[1] - 1
+            status = 206
+            headers["Content-Range"] = f"bytes {first}-{last}/{total}"
+        headers["Content-Length"] = str(last - first + 1)
+        return Response(read_span_bytes(spans, first, last), status=status,
+                        mimetype='video/x-motion-jpeg', headers=headers)
+
+    @app.get('/recordings/<int:cam_id>/play.mjpg')
+    def recording_play(cam_id):
+        """Проигрывание [start, end] как MJPEG-поток в темпе записи (speed — ускорение)."""
+        if not request.args.get('start'):
+            abort(400, "start is required")
+        index, start, end = _rec_range(cam_id, span=float(cfg.get("recording", {}).get("segment_seconds", 60)))
+        speed = max(0.1, request.args.get('speed', 1.0, type=float))
+        spans = index.spans(start, end)
+        if not spans:
+            abort(404)
+
+        def gen():
+            prev = None
+            for ts, jpeg in iter_span_frames(spans):
+                if prev is not None:
+                    time.sleep(min(1.0, max(0.0, ts - prev) / speed))
+                prev = ts
+                yield mjpeg_part(jpeg)
+
+        return Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
     # Static files for masks to download/edit
     @app.get('/download/mask/<int:cam_id>')
     
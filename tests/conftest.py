@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+import app.camera
+import app.web
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class FakeFaceDB:
+    """Без opencv-contrib: камеры в тестах не запускаются, распознавание не нужно."""
+
+    def __init__(self, cfg):
+        pass
+
+    def load(self):
+        return True
+
+    def train(self):
+        return True
+
+
+@pytest.fixture
+def node_config(tmp_path, monkeypatch):
+    """Фабрика config.yaml экземпляра nvr с данными в tmp_path; секции можно переопределить."""
+    monkeypatch.setattr(app.camera, "FaceDB", FakeFaceDB)
+    monkeypatch.setattr(app.web, "FaceDB", FakeFaceDB)
+
+    def make(name="node", **sections):
+        base = tmp_path / name
+        base.mkdir()
+        cfg = yaml.safe_load((ROOT / "config.yaml").read_text(encoding="utf-8"))
+        cfg["cameras"] = cfg["cameras"][:2]
+        for key in ("faces_dir", "masks_dir", "logs_dir", "recordings_dir"):
+            cfg["paths"][key] = str(base / "data" / key.replace("_dir", ""))
+        cfg["logging"]["file"] = str(base / "data" / "logs" / "events.log")
+        # свой логгер = свой журнал событий, как у отдельного процесса
+        cfg["logging"]["name"] = f"test-nvr-{base}"
+        for section, values in sections.items():
+            cfg.setdefault(section, {}).update(values)
+        p = base / "config.yaml"
+        p.write_text(yaml.safe_dump(cfg), encoding="utf-8")
+        return str(p)
+
+    return make
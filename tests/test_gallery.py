@@ -0,0 +1,134 @@
+import os
+import time
+import urllib.parse
+
+import cv2
+import numpy as np
+import pytest
+import yaml
+
+import app.web
+from app.gallery import SheetCache, events_dir
+
+TILE_W, TILE_H, COLS = 40, 30, 2
+BASE = time.time() - 3600
+
+
+def thumb_name(cam_id, i):
+    return f"cam{cam_id}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(BASE + i))}.jpg"
+
+
+def color(i):
+    return (i * 30) % 256
+
+
+@pytest.fixture
+def gallery(node_config):
+    path = node_config(gallery={"sheet_cols": COLS, "tile_width": TILE_W, "tile_height": TILE_H,
+                                "page_size": 100, "jpeg_quality": 95})
+    cfg = yaml.safe_load(open(path, encoding="utf-8"))
+    client = app.web.create_app(path).test_client()
+    thumbs = events_dir(cfg, "thumbs")
+
+    def add(cam_id, i):
+        cv2.imwrite(os.path.join(thumbs, thumb_name(cam_id, i)), np.full((240, 320, 3), color(i), np.uint8))
+
+    for i in range(7):
+        add(0, i)
+    for i in (2, 5):
+        add(1, i + 100)
+    return cfg, client, add
+
+
+def versioned(url, **changes):
+    parts = urllib.parse.urlsplit(url)
+    q = dict(urllib.parse.parse_qsl(parts.query), **changes)
+    return f"{parts.path}?{urllib.parse.urlencode(q)}"
+
+
+def test_paging_newest_first(gallery):
+    _, client, _ = gallery
+    pages = [client.get(f"/api/events?cam=0&limit=3&page={p}").json for p in range(3)]
+    assert [(p["total"], p["pages"], p["page"]) for p in pages] == [(7, 3, 0), (7, 3, 1), (7, 3, 2)]
+    names = [it["name"] for p in pages for it in p["items"]]
+    assert names == [thumb_name(0, i) for i in reversed(range(7))]
+    assert client.get("/api/events").json["total"] == 9
+
+
+def test_impossible_dates_are_skipped(gallery):
+    cfg, client, _ = gallery
+    open(os.path.join(events_dir(cfg, "thumbs"), "cam0_20241399_999999.jpg"), "wb").close()
+    assert client.get("/api/events?cam=0").json["total"] == 7
+    assert client.get("/api/events/sheet.jpg?cam=0").status_code == 302
+
+
+def test_sheet_layout_matches_rendered_tiles(gallery):
+    _, client, _ = gallery
+    j = client.get("/api/events?cam=0&limit=3").json
+    assert j["tile"] == [TILE_W, TILE_H]
+    r = client.get(j["sheet"])
+    assert r.status_code == 200
+    assert "immutable" in r.headers["Cache-Control"]
+    img = cv2.imdecode(np.frombuffer(r.data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert img.shape == (2 * TILE_H, COLS * TILE_W)
+    for it in j["items"]:
+        i = [k for k in range(7) if thumb_name(0, k) == it["name"]][0]
+        px = int(img[it["sheet_y"] + TILE_H // 2, it["sheet_x"] + TILE_W // 2])
+        assert abs(px - color(i)) <= 3
+
+
+def test_sheet_versions(gallery):
+    _, client, add = gallery
+    j = client.get("/api/events?cam=0&limit=3").json
+    r = client.get(j["sheet"])
+    etag = r.headers["ETag"]
+    assert client.get(j["sheet"], headers={"If-None-Match": etag}).status_code == 304
+
+    r = client.get("/api/events/sheet.jpg?cam=0&limit=3")
+    assert r.status_code == 302
+    assert urllib.parse.urlsplit(r.headers["Location"]).query == urllib.parse.urlsplit(j["sheet"]).query
+
+    # страница 1 ещё не собиралась; после нового снимка её состав другой
+    j1 = client.get("/api/events?cam=0&limit=3&page=1").json
+    add(0, 30)
+    assert client.get(j1["sheet"]).status_code == 404
+    # уже собранный лист по старой ссылке неизменен
+    assert client.get(j["sheet"]).status_code == 200
+
+
+@pytest.mark.parametrize("v", ["../../../../secret", "A" * 40, "0" * 39, "0" * 40 + "/"])
+def test_non_sha1_version_is_rejected(gallery, v):
+    cfg, client, _ = gallery
+    sheets = events_dir(cfg, "sheets")
+    secret = os.path.normpath(os.path.join(sheets, "../../../../secret.jpg"))
+    os.makedirs(os.path.dirname(secret), exist_ok=True)
+    with open(secret, "wb") as f:
+        f.write(b"secret")
+    os.utime(secret, (1, 1))
+    r = client.get("/api/events/sheet.jpg?" + urllib.parse.urlencode({"cam": 0, "v": v}),
+                   headers={"If-None-Match": f'"{v}"'})
+    assert r.status_code == 404
+    assert os.stat(secret).st_mtime == 1
+    assert SheetCache(cfg).cached(v) is None
+
+
+def test_lru_eviction_spares_keep_and_tmp(gallery):
+    cfg, _, _ = gallery
+    cfg["gallery"]["cache_max_mb"] = 2.5 / 1024  # 2.5 КБ
+    cache = SheetCache(cfg)
+    os.makedirs(cache.dir, exist_ok=True)
+
+    def put(name, age):
+        p = os.path.join(cache.dir, name)
+        with open(p, "wb") as f:
+            f.write(b"x" * 1024)
+        os.utime(p, (time.time() - age, time.time() - age))
+        return name
+
+    oldest = put("a" * 40 + ".jpg", 400)
+    keep = put("b" * 40 + ".jpg", 300)
+    tmp = put("c" * 40 + ".jpg.1.tmp.jpg", 200)
+    newer = put("d" * 40 + ".jpg", 100)
+    newest = put("e" * 40 + ".jpg", 0)
+    cache._evict(keep=os.path.join(cache.dir, keep))
+    assert sorted(os.listdir(cache.dir)) == sorted([keep, tmp, newest])
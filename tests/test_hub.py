@@ -0,0 +1,182 @@
+"""Хаб против двух локальных экземпляров nvr на одной машине (эфемерные порты)."""
+import io
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+import yaml
+from werkzeug.serving import make_server
+
+import app.web
+from app.hub import StreamRelay, create_hub_app
+from app.stream import mjpeg_part
+
+
+class Server:
+    def __init__(self, wsgi_app):
+        self.srv = make_server("127.0.0.1", 0, wsgi_app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.srv.server_port}"
+        threading.Thread(target=self.srv.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.srv.shutdown()
+        self.srv.server_close()
+
+
+class StreamCounter:
+    """WSGI-обёртка узла: сколько раз открывали /stream/ (т.е. сколько upstream-подключений хаба)."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.streams = 0
+
+    def __call__(self, environ, start_response):
+        if environ["PATH_INFO"].startswith("/stream/"):
+            self.streams += 1
+        return self.wsgi_app(environ, start_response)
+
+
+def wait_for(cond, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as r:
+        return json.loads(r.read().decode("utf-8"))
+
+
+def read_parts(url, n):
+    with urllib.request.urlopen(url, timeout=10) as r:
+        got = 0
+        while got < n:
+            line = r.readline()
+            assert line, "stream ended"
+            if line.lower().startswith(b"content-length:"):
+                r.read(int(line.split(b":")[1]) + 2)
+                got += 1
+    return got
+
+
+@pytest.fixture
+def cluster(tmp_path, node_config):
+
+    servers = []
+    nodes = {}
+    for name in ("atm-1", "atm-2"):
+        counter = StreamCounter(app.web.create_app(node_config(name)))
+        srv = Server(counter)
+        servers.append(srv)
+        nodes[name] = (srv, counter)
+
+    hub_cfg = {
+        "nodes": [{"name": n, "url": srv.url} for n, (srv, _) in nodes.items()],
+        "hub": {"poll_seconds": 0.1, "timeout": 2, "preview_fps": 10, "preview_width": 160,
+                "idle_seconds": 0.3, "stale_seconds": 1, "keepalive_seconds": 0.3},
+        "logging": {"file": str(tmp_path / "hub.log"), "level": "INFO", "name": f"test-hub-{tmp_path}"},
+    }
+    hub_cfg_path = tmp_path / "hub.yaml"
+    hub_cfg_path.write_text(yaml.safe_dump(hub_cfg), encoding="utf-8")
+    hub = Server(create_hub_app(str(hub_cfg_path)))
+    servers.append(hub)
+
+    assert wait_for(lambda: all(n["online"] for n in get_json(hub.url + "/api/nodes").values()))
+    yield hub, nodes, tmp_path
+    for srv in servers:
+        srv.close()
+
+
+def test_events_follow_node_cursor_and_resync_after_restart(cluster, node_config):
+    hub, nodes, _ = cluster
+    srv, _ = nodes["atm-1"]
+    urllib.request.urlopen(urllib.request.Request(srv.url + "/api/stop", data=b"", method="POST"))
+
+    def msgs(since=0):
+        return [(e["node"], e["msg"]) for e in get_json(f"{hub.url}/api/events?since={since}")["events"]]
+
+    assert wait_for(lambda: ("atm-1", "Camera 0 stopped") in msgs())
+    cursor = get_json(hub.url + "/api/events")["cursor"]
+    time.sleep(0.5)
+    # без новых событий дельта пустая — повторной загрузки нет
+    assert msgs(cursor) == []
+
+    # «перезапуск» atm-1 на том же порту: seq узла начинается заново
+    port = srv.srv.server_port
+    srv.close()
+    restarted = app.web.create_app(node_config("atm-1-restarted"))
+    srv2 = Server.__new__(Server)
+    srv2.srv = make_server("127.0.0.1", port, restarted, threaded=True)
+    threading.Thread(target=srv2.srv.serve_forever, daemon=True).start()
+    try:
+        assert wait_for(lambda: get_json(hub.url + "/api/nodes")["atm-1"]["online"])
+        urllib.request.urlopen(urllib.request.Request(srv.url + "/api/stop", data=b"", method="POST"))
+        assert wait_for(lambda: msgs(cursor).count(("atm-1", "Camera 1 stopped")) == 1)
+    finally:
+        srv2.srv.shutdown()
+        srv2.srv.server_close()
+
+
+def test_preview_fan_out_and_idle_close(cluster):
+    hub, nodes, _ = cluster
+    _, counter = nodes["atm-1"]
+    url = hub.url + "/stream/atm-1/0.mjpg"
+
+    results = []
+    viewers = [threading.Thread(target=lambda: results.append(read_parts(url, 3))) for _ in range(3)]
+    for t in viewers:
+        t.start()
+    for t in viewers:
+        t.join(timeout=15)
+    assert results == [3, 3, 3]
+    assert counter.streams == 1  # одно подключение к узлу на всех зрителей
+
+    # после ухода зрителей relay закрывается; новый зритель открывает новое подключение
+    time.sleep(1.0)
+    read_parts(url, 3)
+    assert counter.streams == 2
+
+
+def test_unknown_camera_is_rejected(cluster):
+    hub, _, _ = cluster
+    for path in ("/stream/atm-1/999.mjpg", "/stream/nope/0.mjpg"):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(hub.url + path, timeout=5)
+        assert e.value.code == 404
+
+
+def test_viewer_of_offline_node_gets_no_signal_and_is_released(cluster):
+    hub, nodes, tmp_path = cluster
+    srv, counter = nodes["atm-2"]
+    assert read_parts(hub.url + "/stream/atm-2/1.mjpg", 1) == 1
+    srv.close()
+    # кадров нет, но поток не замолкает: keepalive с заглушкой
+    assert read_parts(hub.url + "/stream/atm-2/1.mjpg", 2) == 2
+    # зритель ушёл — это замечено по записи keepalive, relay к мёртвому узлу закрыт
+    hub_log = tmp_path / "hub.log"
+    assert wait_for(lambda: f"relay closed {srv.url}/stream/1.mjpg" in hub_log.read_text(encoding="utf-8"))
+
+
+def test_node_rejects_bad_preview_width(cluster):
+    _, nodes, _ = cluster
+    srv, _ = nodes["atm-1"]
+    for q in ("width=1", "width=-5", "fps=0"):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(f"{srv.url}/stream/0.mjpg?{q}", timeout=5)
+        assert e.value.code == 400
+
+
+def test_relay_parses_content_length_parts():
+    relay = StreamRelay("http://unused", {}, logging.getLogger("test"))
+    body = b"".join(mjpeg_part(b"\xff\xd8" + bytes([i]) * 50 + b"\r\n--frame\xff\xd9") for i in range(3))
+    relay._pump(io.BufferedReader(io.BytesIO(body)))
+    seq, frame = relay.latest()
+    assert seq == 3
+    assert frame == b"\xff\xd8" + bytes([2]) * 50 + b"\r\n--frame\xff\xd9"
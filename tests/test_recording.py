@@ -0,0 +1,120 @@
+import logging
+import os
+
+import cv2
+import numpy as np
+import pytest
+import yaml
+
+import app.web
+from app.recording import IDX_EXT, SEG_EXT, SegmentIndex, SegmentWriter, camera_dir, prune_segments
+
+T0 = 1700000000.0
+log = logging.getLogger("test-recording")
+
+
+def frame(i):
+    return np.full((48, 64, 3), (i * 7) % 256, dtype=np.uint8)
+
+
+def jpeg(i, quality=80):
+    return cv2.imencode(".jpg", frame(i), [int(cv2.IMWRITE_JPEG_QUALITY), quality])[1].tobytes()
+
+
+@pytest.fixture
+def recorded(node_config):
+    """25 кадров раз в секунду, сегменты по 10 с: 3 сегмента."""
+    path = node_config(recording={"segment_seconds": 10, "max_window_hours": 1, "retention_hours": 0})
+    cfg = yaml.safe_load(open(path, encoding="utf-8"))
+    w = SegmentWriter(cfg, 0, log)
+    for i in range(25):
+        assert w.write(frame(i), ts=T0 + i)
+    w.close()
+    client = app.web.create_app(path).test_client()
+    return cfg, client
+
+
+def test_segments_are_fixed_length(recorded):
+    cfg, client = recorded
+    segs = client.get(f"/api/recordings/0?start={T0}&end={T0 + 30}").json
+    assert [(s["start"], s["frames"]) for s in segs] == [(T0, 10), (T0 + 10, 10), (T0 + 20, 5)]
+
+
+def test_clip_crosses_segment_boundary(recorded):
+    _, client = recorded
+    r = client.get(f"/recordings/0/clip.mjpg?start={T0 + 8}&end={T0 + 12}")
+    assert r.status_code == 200
+    assert r.data == b"".join(jpeg(i) for i in range(8, 13))
+    assert r.headers["Content-Length"] == str(len(r.data))
+
+
+def test_clip_ranges(recorded):
+    _, client = recorded
+    url = f"/recordings/0/clip.mjpg?start={T0 + 8}&end={T0 + 12}"
+    full = b"".join(jpeg(i) for i in range(8, 13))
+    total = len(full)
+
+    r = client.get(url, headers={"Range": "bytes=10-1999"})
+    assert r.status_code == 206
+    assert r.headers["Content-Range"] == f"bytes 10-1999/{total}"
+    assert r.data == full[10:2000]
+
+    r = client.get(url, headers={"Range": "bytes=-50"})
+    assert r.status_code == 206
+    assert r.headers["Content-Range"] == f"bytes {total - 50}-{total - 1}/{total}"
+    assert r.data == full[-50:]
+
+    r = client.get(url, headers={"Range": f"bytes={total}-"})
+    assert r.status_code == 416
+    assert r.headers["Content-Range"] == f"bytes */{total}"
+
+
+def test_window_limits(recorded):
+    _, client = recorded
+    assert client.get(f"/api/recordings/0?start={T0}&end={T0 + 7200}").status_code == 400
+    assert client.get(f"/recordings/0/clip.mjpg?start={T0}").status_code == 400
+    assert client.get("/api/recordings/0?start=bad").status_code == 400
+    assert client.get(f"/recordings/0/clip.mjpg?start={T0 + 100}&end={T0 + 200}").status_code == 404
+    assert client.get("/api/recordings/9").status_code == 404
+
+
+def test_name_collision_never_reuses_files(node_config):
+    cfg = yaml.safe_load(open(node_config(recording={"retention_hours": 0}), encoding="utf-8"))
+    d = camera_dir(cfg, 0)
+    os.makedirs(d)
+    # осиротевший сегмент без индекса с тем же именем не перезаписывается
+    orphan = os.path.join(d, str(int(T0 * 1000) + 1) + SEG_EXT)
+    with open(orphan, "wb") as f:
+        f.write(b"old")
+    for i in range(2):
+        w = SegmentWriter(cfg, 0, log)
+        w.write(frame(i), ts=T0)
+        w.close()
+
+    with open(orphan, "rb") as f:
+        assert f.read() == b"old"
+    index = SegmentIndex(cfg, 0)
+    names = [name for _, name in index.segments()]
+    assert names == [str(int(T0 * 1000)), str(int(T0 * 1000) + 2)]
+    for i, name in enumerate(names):
+        assert index.frames(name) == [(T0, 0, len(jpeg(i)))]
+
+
+def test_prune_keeps_last_segment(recorded):
+    cfg, _ = recorded
+    cfg["recording"]["retention_hours"] = 1  # T0 — давно в прошлом
+    assert prune_segments(cfg, 0, log) == 2
+    d = camera_dir(cfg, 0)
+    assert sorted(os.listdir(d)) == [str(int((T0 + 20) * 1000)) + ext for ext in (IDX_EXT, SEG_EXT)]
+
+
+def test_write_error_stops_writer_instead_of_raising(node_config):
+    cfg = yaml.safe_load(open(node_config(), encoding="utf-8"))
+    # recordings_dir — файл: каталог камеры создать нельзя (как ENOSPC/EACCES)
+    os.makedirs(os.path.dirname(cfg["paths"]["recordings_dir"]), exist_ok=True)
+    with open(cfg["paths"]["recordings_dir"], "w") as f:
+        f.write("x")
+    w = SegmentWriter(cfg, 0, log)
+    assert w.write(frame(0), ts=T0) is False
+    assert w.failed
+    assert w.write(frame(1), ts=T0 + 1) is False